@@ -1,53 +1,137 @@
 import argparse
 from pathlib import Path
+import numpy as np
 import pandas as pd
 
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, Alignment, PatternFill
-from openpyxl.utils.dataframe import dataframe_to_rows
+from openpyxl.utils import get_column_letter
 from openpyxl.chart import LineChart, BarChart, Reference
 
 
 SLA_THRESHOLDS = {"P1": 60, "P2": 240, "P3": 1440, "P4": 2880}
 
-
-def autosize(ws):
-    for col in ws.columns:
-        max_len = 0
-        col_letter = col[0].column_letter
-        for cell in col:
-            val = "" if cell.value is None else str(cell.value)
-            max_len = max(max_len, len(val))
-        ws.column_dimensions[col_letter].width = min(max(10, max_len + 2), 50)
-
-
-def style_header(ws, row=1):
-    header_fill = PatternFill("solid", fgColor="1F2937")  # dark
-    header_font = Font(color="FFFFFF", bold=True)
-    for c in ws[row]:
-        c.fill = header_fill
-        c.font = header_font
-        c.alignment = Alignment(horizontal="center", vertical="center")
-
-
-def write_df(ws, df, start_row=1, start_col=1):
-    for r_idx, r in enumerate(dataframe_to_rows(df, index=False, header=True), start=start_row):
-        for c_idx, v in enumerate(r, start=start_col):
-            ws.cell(row=r_idx, column=c_idx, value=v)
-    style_header(ws, start_row)
-    autosize(ws)
+# Low-cardinality text columns, stored as category dtype
+CATEGORY_COLUMNS = [
+    "user_role","device_type","site","network_path","vendor","issue_category","priority"
+]
+
+# Header styles, shared by every sheet
+HEADER_FILL = PatternFill("solid", fgColor="1F2937")  # dark
+HEADER_FONT = Font(color="FFFFFF", bold=True)
+HEADER_ALIGN = Alignment(horizontal="center", vertical="center")
+
+# Recommendation rules, checked in order: first keyword match wins
+RECOMMENDATION_RULES = [
+    (("vpn", "remote access"),
+     "Standardize remote connectivity: client versions, certificates, MFA/token health, and VPN profiles."),
+    (("o365",),
+     "Review O365 sign-in failures: conditional access, MFA policies, and identity provider health."),
+    (("teams",),
+     "Reduce Teams incidents: baseline AV drivers/firmware, device profile standards, and known-good configs."),
+    (("conference", "av"),
+     "Conference room reliability: pre-meeting health checks + standard room profiles + vendor runbooks."),
+    (("edr", "phishing", "mfa"),
+     "Security workflow: triage playbooks + alert classification + escalation paths + SLA-backed response."),
+]
+
+
+def recommendation_for(issue):
+    i = issue.lower()
+    for keywords, rec in RECOMMENDATION_RULES:
+        if any(k in i for k in keywords):
+            return rec
+    return f"{issue}: create a repeatable fix playbook and measure post-change incident reduction."
+
+
+def compute_widths(df):
+    widths = []
+    for col in df.columns:
+        values = df[col]
+        # Missing values are written as blank cells, so they measure as zero
+        longest = values.astype(str).str.len().where(values.notna(), 0).max()
+        max_len = len(str(col))
+        if pd.notna(longest):
+            max_len = max(max_len, int(longest))
+        widths.append(min(max(10, max_len + 2), 50))
+    return widths
+
+
+def autosize(ws, df):
+    # Widths come from the DataFrame rather than the written cells, since
+    # write-only sheets must have their columns sized before the first row.
+    for idx, width in enumerate(compute_widths(df), start=1):
+        ws.column_dimensions[get_column_letter(idx)].width = width
+
+
+def style_header(ws, values):
+    cells = []
+    for v in values:
+        c = WriteOnlyCell(ws, value=v)
+        c.fill = HEADER_FILL
+        c.font = HEADER_FONT
+        c.alignment = HEADER_ALIGN
+        cells.append(c)
+    return cells
+
+
+def write_df(ws, df):
+    autosize(ws, df)
+    ws.append(style_header(ws, df.columns))
+    for row in df.itertuples(index=False, name=None):
+        ws.append(row)
+
+
+def category_rca_duckdb(csv_path):
+    # Same breakdown as the pandas path, aggregated by DuckDB straight off the CSV
+    import duckdb
+
+    sla_values = ", ".join("(?, ?)" for _ in SLA_THRESHOLDS)
+    sla_params = [v for item in SLA_THRESHOLDS.items() for v in item]
+    query = f"""
+        WITH sla(priority, sla_minutes) AS (VALUES {sla_values}),
+        incidents AS (
+            SELECT
+                incident_id,
+                issue_category,
+                TRIM(CAST(priority AS VARCHAR)) AS priority,
+                TRY_CAST(resolution_minutes AS DOUBLE) AS resolution_minutes
+            FROM read_csv_auto(?)
+        )
+        SELECT
+            issue_category,
+            COUNT(incident_id) AS count,
+            AVG(resolution_minutes) AS avg_minutes,
+            MEDIAN(resolution_minutes) AS median_minutes,
+            MAX(resolution_minutes) AS max_minutes,
+            COUNT(*) FILTER (WHERE resolution_minutes > sla.sla_minutes) AS breaches
+        FROM incidents LEFT JOIN sla USING (priority)
+        WHERE issue_category IS NOT NULL
+        GROUP BY issue_category
+        ORDER BY count DESC, breaches DESC, issue_category
+    """
+    with duckdb.connect() as con:
+        return con.execute(query, sla_params + [str(csv_path)]).df()
 
 
 def main():
     parser = argparse.ArgumentParser(description="Endpoint + Security Incident Trend Analyzer: CSV -> Excel report")
     parser.add_argument("csv_path", help="Path to incident CSV export")
     parser.add_argument("--out", default="reports/incident_trends_report.xlsx", help="Output Excel report path")
+    parser.add_argument("--include-raw-xlsx", action="store_true",
+                        help="Also write the full row-level data to a Raw_Data sheet (slow for large exports)")
+    parser.add_argument("--engine", choices=["pandas", "duckdb"], default="pandas",
+                        help="Engine for the category RCA aggregation (duckdb must be installed)")
     args = parser.parse_args()
 
     csv_path = Path(args.csv_path)
     out_path = Path(args.out)
     out_path.parent.mkdir(parents=True, exist_ok=True)
+    raw_path = out_path.with_name(f"{out_path.stem}_raw_data.parquet")
 
-    df = pd.read_csv(csv_path)
+    # The multithreaded Arrow parser also types ISO timestamps while reading
+    df = pd.read_csv(csv_path, engine="pyarrow")
 
     required = [
         "incident_id","opened_at","resolved_at","user_role","device_type","site",
@@ -60,59 +144,76 @@ def main():
     # Normalize
     df["opened_at"] = pd.to_datetime(df["opened_at"], errors="coerce")
     df["resolved_at"] = pd.to_datetime(df["resolved_at"], errors="coerce")
-    df["resolved"] = df["resolved"].astype(str).str.strip().str.lower().map({"yes": True, "no": False})
+    # Sort once up front: Raw_Data wants time order and the daily groupby can skip its sort
+    df.sort_values("opened_at", inplace=True, ignore_index=True)
+    resolved_str = df["resolved"].astype(str).str.strip().str.lower()
+    df["resolved"] = resolved_str.eq("yes").where(resolved_str.isin(["yes", "no"]))
     df["priority"] = df["priority"].astype(str).str.strip()
-    df["resolution_minutes"] = pd.to_numeric(df["resolution_minutes"], errors="coerce")
-
-    df["date"] = df["opened_at"].dt.date
-    df["is_executive"] = df["user_role"].astype(str).str.strip().str.lower().eq("executive")
-
-    df["sla_minutes"] = df["priority"].map(SLA_THRESHOLDS)
-    df["sla_breached"] = (
-        df["resolution_minutes"].notna()
-        & df["sla_minutes"].notna()
-        & (df["resolution_minutes"] > df["sla_minutes"])
-    )
+    for c in CATEGORY_COLUMNS:
+        df[c] = df[c].astype("category")
+    df["resolution_minutes"] = pd.to_numeric(df["resolution_minutes"], errors="coerce", downcast="integer")
+
+    df["date"] = df["opened_at"].dt.floor("D")
+    # Normalise the handful of role categories rather than every row; a column
+    # that is blank throughout comes back from the parser as float, hence astype(str)
+    roles = df["user_role"].cat.categories
+    is_exec_role = roles.astype(str).str.strip().str.lower() == "executive"
+    df["is_executive"] = df["user_role"].isin(roles[is_exec_role])
+
+    # Look up each priority category once, then spread to rows by category code;
+    # the trailing NaN catches code -1 (missing priority)
+    priorities = df["priority"].cat
+    sla_by_code = np.append(priorities.categories.map(SLA_THRESHOLDS).to_numpy(dtype=float), np.nan)
+    df["sla_minutes"] = sla_by_code[priorities.codes.to_numpy()]
+    minutes = df["resolution_minutes"].to_numpy(dtype=float)
+    sla_minutes = df["sla_minutes"].to_numpy(dtype=float)
+    have_time = ~np.isnan(minutes)
+    timed_mask = have_time & ~np.isnan(sla_minutes)
+    # NaN compares False, so rows missing either value are never breaches
+    df["sla_breached"] = minutes > sla_minutes
 
     total = len(df)
-    resolved_count = int(df["resolved"].fillna(False).sum())
+    # Cast once so the groupbys below can use the built-in "sum" reducer
+    resolved_flag = df["resolved"].fillna(False).astype(bool)
+    resolved_count = int(resolved_flag.sum())
     unresolved_count = total - resolved_count
 
-    mttr = df.loc[df["resolution_minutes"].notna(), "resolution_minutes"].mean()
-    p95 = df.loc[df["resolution_minutes"].notna(), "resolution_minutes"].quantile(0.95)
+    times = minutes[have_time]
+    mttr = times.mean() if len(times) else np.nan
+    p95 = np.quantile(times, 0.95) if len(times) else np.nan
 
     # Trends (daily)
+    by_date = resolved_flag.groupby(df["date"], sort=False, dropna=False)
     trends = (
-        df.groupby("date", dropna=False)
-        .agg(
-            incidents=("incident_id","count"),
-            resolved=("resolved", lambda s: int(s.fillna(False).sum())),
-            unresolved=("resolved", lambda s: int((~s.fillna(False)).sum()))
-        )
+        pd.DataFrame({"incidents": by_date.size(), "resolved": by_date.sum()})
+        .assign(unresolved=lambda x: x["incidents"] - x["resolved"])
         .reset_index()
-        .sort_values("date")
+        .assign(date=lambda x: x["date"].dt.date)  # plain dates render as yyyy-mm-dd
     )
 
     # RCA-style category breakdown
-    by_cat = (
-        df.groupby("issue_category")
-        .agg(
-            count=("incident_id","count"),
-            pct=("incident_id", lambda s: round(len(s) / max(total,1) * 100, 1)),
-            avg_minutes=("resolution_minutes","mean"),
-            median_minutes=("resolution_minutes","median"),
-            max_minutes=("resolution_minutes","max"),
-            breaches=("sla_breached", lambda s: int(s.sum()))
+    if args.engine == "duckdb":
+        by_cat = category_rca_duckdb(csv_path)
+    else:
+        by_cat = (
+            df.groupby("issue_category", observed=True)
+            .agg(
+                count=("incident_id","count"),
+                avg_minutes=("resolution_minutes","mean"),
+                median_minutes=("resolution_minutes","median"),
+                max_minutes=("resolution_minutes","max"),
+                breaches=("sla_breached","sum")
+            )
+            .reset_index()
+            .sort_values(["count","breaches"], ascending=[False, False])
         )
-        .reset_index()
-        .sort_values(["count","breaches"], ascending=[False, False])
-    )
+    by_cat.insert(2, "pct", (by_cat["count"] / max(total,1) * 100).round(1))
     for c in ["avg_minutes","median_minutes","max_minutes"]:
         by_cat[c] = by_cat[c].round(1)
 
     # Executive impact
     exec_impact = (
-        df.groupby(["is_executive","issue_category"])
+        df.groupby(["is_executive","issue_category"], observed=True)
         .size()
         .reset_index(name="count")
         .assign(user_group=lambda x: x["is_executive"].map({True:"Executive", False:"Non-Executive"}))
@@ -122,36 +223,19 @@ def main():
 
     # SLA risk
     sla = (
-        df[df["sla_minutes"].notna() & df["resolution_minutes"].notna()]
-        .groupby("priority")
-        .agg(total_with_sla=("incident_id","count"), breaches=("sla_breached", lambda s: int(s.sum())))
+        df.loc[timed_mask, ["priority","incident_id","sla_breached"]]
+        .groupby("priority", observed=True)
+        .agg(total_with_sla=("incident_id","count"), breaches=("sla_breached","sum"))
         .reset_index()
     )
     sla["breach_rate_percent"] = (sla["breaches"] / sla["total_with_sla"] * 100).round(1)
 
     # Heatmap-like pivot (Category x Priority)
-    heat = pd.pivot_table(
-        df, index="issue_category", columns="priority", values="incident_id",
-        aggfunc="count", fill_value=0
-    ).reset_index()
+    heat = pd.crosstab(df["issue_category"], df["priority"]).reset_index()
 
     # Recommendations (simple, credible)
     top = by_cat.head(5)["issue_category"].tolist()
-    recs = []
-    for issue in top:
-        i = issue.lower()
-        if "vpn" in i or "remote access" in i:
-            recs.append("Standardize remote connectivity: client versions, certificates, MFA/token health, and VPN profiles.")
-        elif "o365" in i:
-            recs.append("Review O365 sign-in failures: conditional access, MFA policies, and identity provider health.")
-        elif "teams" in i:
-            recs.append("Reduce Teams incidents: baseline AV drivers/firmware, device profile standards, and known-good configs.")
-        elif "conference" in i or "av" in i:
-            recs.append("Conference room reliability: pre-meeting health checks + standard room profiles + vendor runbooks.")
-        elif "edr" in i or "phishing" in i or "mfa" in i:
-            recs.append("Security workflow: triage playbooks + alert classification + escalation paths + SLA-backed response.")
-        else:
-            recs.append(f"{issue}: create a repeatable fix playbook and measure post-change incident reduction.")
+    recs = [recommendation_for(issue) for issue in top]
     recommendations = pd.DataFrame({"recommendation": recs})
 
     # Executive summary table
@@ -168,15 +252,15 @@ def main():
         columns=["metric","value"]
     )
 
-    # Write Excel with formatting + charts
-    from openpyxl import Workbook
-    wb = Workbook()
-
-    # Replace default sheet
-    wb.remove(wb.active)
+    # Write Excel with formatting + charts. Write-only mode streams rows
+    # straight to disk, so every sheet is written top to bottom in one go.
+    wb = Workbook(write_only=True)
 
     ws = wb.create_sheet("Executive_Summary")
     write_df(ws, summary)
+    ws.append([])
+    raw_link = raw_path.name.replace('"', '""')  # quotes are doubled inside formula strings
+    ws.append(["Raw data", f'=HYPERLINK("{raw_link}","{raw_link}")'])
 
     ws2 = wb.create_sheet("Trends_Daily")
     write_df(ws2, trends)
@@ -207,21 +291,9 @@ def main():
         chart2.y_axis.title = "Count"
         chart2.x_axis.title = "Category"
 
-        # Write a small chart table to the right
-        chart_df = by_cat[["issue_category","count"]].head(top_n).copy()
-        start_row = 2
-        start_col = 10
-        ws3.cell(1, start_col, "issue_category")
-        ws3.cell(1, start_col+1, "count")
-        ws3.cell(1, start_col).font = Font(bold=True)
-        ws3.cell(1, start_col+1).font = Font(bold=True)
-
-        for i, row in enumerate(chart_df.itertuples(index=False), start=start_row):
-            ws3.cell(i, start_col, row.issue_category)
-            ws3.cell(i, start_col+1, int(row.count))
-
-        data = Reference(ws3, min_col=start_col+1, min_row=1, max_row=start_row + top_n - 1)
-        cats = Reference(ws3, min_col=start_col, min_row=2, max_row=start_row + top_n - 1)
+        # Plot straight from the issue_category/count columns of the RCA table
+        data = Reference(ws3, min_col=2, min_row=1, max_row=1 + top_n)
+        cats = Reference(ws3, min_col=1, min_row=2, max_row=1 + top_n)
         chart2.add_data(data, titles_from_data=True)
         chart2.set_categories(cats)
         chart2.height = 12
@@ -240,14 +312,19 @@ def main():
     ws7 = wb.create_sheet("Recommendations")
     write_df(ws7, recommendations)
 
-    ws8 = wb.create_sheet("Raw_Data")
-    write_df(ws8, df.sort_values("opened_at"))
+    # Row-level data goes to a columnar sidecar; the workbook holds the summaries
+    df.to_parquet(raw_path, index=False, compression="zstd")
+
+    if args.include_raw_xlsx:
+        ws8 = wb.create_sheet("Raw_Data")
+        write_df(ws8, df.assign(date=df["date"].dt.date))
 
     wb.save(out_path)
 
     print("Endpoint + Security Incident Trend Analyzer")
     print(f"Input:  {csv_path}")
     print(f"Output: {out_path}")
+    print(f"Raw:    {raw_path}")
     print("\nTop 5 categories:")
     print(by_cat[["issue_category","count","avg_minutes","breaches"]].head(5).to_string(index=False))
     print("\nKey KPIs:")
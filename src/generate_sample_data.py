@@ -1,9 +1,8 @@
-import random
 from datetime import datetime, timedelta
 from pathlib import Path
-import csv
 
-random.seed(7)
+import numpy as np
+import pandas as pd
 
 ISSUES = [
     ("VPN Authentication", ["P2", "P3"]),
@@ -28,62 +27,67 @@ SITES = ["NYC-HQ", "NYC-Branch", "Remote"]
 NETWORK = ["Wired", "WiFi", "VPN"]
 VENDORS = ["Microsoft", "Cisco", "Zoom", "Okta", "CrowdStrike", "Dell", "HP", "Unknown"]
 
-def gen_resolution_minutes(priority: str) -> int:
+# (mean, std dev, floor) of resolution minutes per priority
+RESOLUTION_PARAMS = {
+    "P1": (55, 20, 10),
+    "P2": (180, 80, 15),
+    "P3": (600, 260, 10),
+    "P4": (1500, 500, 20),
+}
+
+def gen_resolution_minutes(rng, priorities: np.ndarray) -> np.ndarray:
     # realistic-ish response distributions
-    if priority == "P1":
-        return max(10, int(random.gauss(55, 20)))
-    if priority == "P2":
-        return max(15, int(random.gauss(180, 80)))
-    if priority == "P3":
-        return max(10, int(random.gauss(600, 260)))
-    return max(20, int(random.gauss(1500, 500)))  # P4
+    params = np.array(list(RESOLUTION_PARAMS.values()), dtype=float)
+    mu, sigma, floor = params[pd.Index(list(RESOLUTION_PARAMS)).get_indexer(priorities)].T
+    return np.maximum(floor, rng.normal(mu, sigma).astype(int)).astype(int)
 
 def main():
     out = Path("data/sample_incidents.csv")
     out.parent.mkdir(parents=True, exist_ok=True)
 
+    rng = np.random.default_rng(7)
+    n = 240  # incidents
+
     now = datetime.now()
     start = now - timedelta(days=30)
+    opened = pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, 30 * 24 * 60 + 1, n), unit="min")
 
-    rows = []
-    for i in range(1, 241):  # 240 incidents
-        opened = start + timedelta(minutes=random.randint(0, 30 * 24 * 60))
-        issue, pri_choices = random.choice(ISSUES)
-        priority = random.choice(pri_choices)
-
-        role = random.choices(ROLES, weights=[10, 12, 20, 45, 13], k=1)[0]
-        device = random.choices(DEVICES, weights=[70, 30], k=1)[0]
-        site = random.choices(SITES, weights=[45, 20, 35], k=1)[0]
-        net = random.choices(NETWORK, weights=[30, 25, 45], k=1)[0]
-        vendor = random.choice(VENDORS)
+    # Each issue's priority choices padded to two columns, so a single random
+    # column pick is a uniform choice among that issue's priorities
+    issue_names = np.array([issue for issue, _ in ISSUES])
+    issue_priorities = np.array([(pris * 2)[:2] for _, pris in ISSUES])
+    issue_idx = rng.integers(0, len(ISSUES), n)
+    priority = issue_priorities[issue_idx, rng.integers(0, 2, n)]
 
-        # unresolved tail (about 6%)
-        unresolved = random.random() < 0.06
+    role = rng.choice(ROLES, n, p=np.array([10, 12, 20, 45, 13]) / 100)
+    device = rng.choice(DEVICES, n, p=np.array([70, 30]) / 100)
+    site = rng.choice(SITES, n, p=np.array([45, 20, 35]) / 100)
+    net = rng.choice(NETWORK, n, p=np.array([30, 25, 45]) / 100)
+    vendor = rng.choice(VENDORS, n)
 
-        res_minutes = gen_resolution_minutes(priority)
-        resolved_at = "" if unresolved else (opened + timedelta(minutes=res_minutes)).strftime("%Y-%m-%d %H:%M")
+    # unresolved tail (about 6%)
+    unresolved = rng.random(n) < 0.06
 
-        rows.append({
-            "incident_id": f"INC{i:04d}",
-            "opened_at": opened.strftime("%Y-%m-%d %H:%M"),
-            "resolved_at": resolved_at,
-            "user_role": role,
-            "device_type": device,
-            "site": site,
-            "network_path": net,
-            "vendor": vendor,
-            "issue_category": issue,
-            "priority": priority,
-            "resolution_minutes": "" if unresolved else res_minutes,
-            "resolved": "No" if unresolved else "Yes",
-        })
+    res_minutes = pd.Series(gen_resolution_minutes(rng, priority), dtype="Int64")
+    resolved_at = (opened + pd.to_timedelta(res_minutes.to_numpy(dtype=float), unit="min")).strftime("%Y-%m-%d %H:%M")
 
-    with out.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
-        writer.writeheader()
-        writer.writerows(rows)
+    df = pd.DataFrame({
+        "incident_id": "INC" + pd.Series(np.arange(1, n + 1)).astype(str).str.zfill(4),
+        "opened_at": opened.strftime("%Y-%m-%d %H:%M"),
+        "resolved_at": np.where(unresolved, "", resolved_at),
+        "user_role": role,
+        "device_type": device,
+        "site": site,
+        "network_path": net,
+        "vendor": vendor,
+        "issue_category": issue_names[issue_idx],
+        "priority": priority,
+        "resolution_minutes": res_minutes.mask(unresolved),
+        "resolved": np.where(unresolved, "No", "Yes"),
+    })
+    df.to_csv(out, index=False)
 
-    print(f"Wrote {len(rows)} rows to {out}")
+    print(f"Wrote {len(df)} rows to {out}")
 
 if __name__ == "__main__":
     main()